@@ -1,7 +1,13 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 import re
 from tqdm import tqdm
 
+# Pattern: "Name vs Name on Date"
+TITLE_PATTERN = re.compile(r'^(.+?)\s+(?:vs?\.?|versus)\s+(.+?)\s+on\s+\d', re.IGNORECASE)
+
+# Title updates sent per bulk_write
+BATCH_SIZE = 1000
+
 def fix_titles_from_summary():
     """
     Extract better titles from case summaries
@@ -10,22 +16,32 @@ def fix_titles_from_summary():
     db = client['legal_cases']
     cases = db['cases']
     
-    # Find cases with "Unknown" title
-    unknown_cases = cases.find({'title': 'Unknown'})
+    # Partial index covering only 'Unknown' titles, so the count and find
+    # below touch the matching cases instead of scanning the collection
+    cases.create_index(
+        [('title', 1)],
+        name='title_unknown',
+        partialFilterExpression={'title': 'Unknown'}
+    )
+    
+    # Find cases with "Unknown" title (only the fields we read, not raw_text)
+    unknown_cases = cases.find(
+        {'title': 'Unknown'},
+        projection={'summary': 1, 'cleaned_text': 1}
+    ).batch_size(1000)
     count = cases.count_documents({'title': 'Unknown'})
     
     print(f"📊 Found {count:,} cases with 'Unknown' title")
     print("🔧 Extracting titles from summaries...\n")
     
     fixed = 0
+    ops = []
     
     for case in tqdm(unknown_cases, total=count, desc="Fixing titles"):
         summary = case.get('summary', '') or case.get('cleaned_text', '')[:500]
         
         # Try to extract title from summary
-        # Pattern: "Name vs Name on Date"
-        pattern = r'^(.+?)\s+(?:vs?\.?|versus)\s+(.+?)\s+on\s+\d'
-        match = re.search(pattern, summary, re.IGNORECASE)
+        match = TITLE_PATTERN.search(summary)
         
         if match:
             petitioner = match.group(1).strip()
@@ -37,13 +53,20 @@ def fix_titles_from_summary():
             
             new_title = f"{petitioner} vs {respondent}"
             
-            # Update in MongoDB
-            cases.update_one(
+            # Queue update for MongoDB
+            ops.append(UpdateOne(
                 {'_id': case['_id']},
                 {'$set': {'title': new_title}}
-            )
+            ))
             
             fixed += 1
+            
+            if len(ops) >= BATCH_SIZE:
+                cases.bulk_write(ops, ordered=False)
+                ops = []
+    
+    if ops:
+        cases.bulk_write(ops, ordered=False)
     
     print(f"\n✅ Fixed {fixed:,} titles!")
     print(f"⏭️  Remaining 'Unknown': {count - fixed:,}")
@@ -51,4 +74,4 @@ def fix_titles_from_summary():
     client.close()
 
 if __name__ == "__main__":
-    fix_titles_from_summary()
\ No newline at end of file
+    fix_titles_from_summary()
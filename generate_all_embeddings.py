@@ -1,4 +1,5 @@
 from src.etl.transform import CaseEmbeddingGenerator
+import logging
 import time
 from datetime import datetime
 
@@ -31,7 +32,7 @@ def main():
     
     # Generate embeddings for ALL cases
     generator.generate_embeddings_batch(
-        batch_size=32,       # Process 32 cases at once (optimal for most CPUs)
+        batch_size=None,     # Default: 1024 cases per encode call (length-sorted)
         limit=None,          # Process ALL cases
         skip_existing=True   # Skip if already done (safe for resuming)
     )
@@ -54,4 +55,5 @@ def main():
     print("🎯 Ready for semantic search!")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     main()
\ No newline at end of file
@@ -0,0 +1,78 @@
+from pymongo import MongoClient, UpdateOne
+from tqdm import tqdm
+import numpy as np
+
+from src.models.embeddings import (
+    decode_embedding, quantize_embedding, EmbeddingProjection, PROJECTION_ID
+)
+
+# Reduced dimension of the int8 copies the search index is built from
+TARGET_DIM = 128
+
+# Embeddings sampled to fit the PCA
+SAMPLE_SIZE = 50000
+
+# Updates sent per bulk_write
+BATCH_SIZE = 1000
+
+def reduce_embeddings():
+    """
+    Fit a whitened PCA (384 -> 128) on stored embeddings, save it to the
+    meta collection and rewrite every embedding_q8 in the reduced space.
+    The float32 'embedding' vectors are left as they are.
+    Restart the API afterwards so its index is rebuilt.
+    """
+    client = MongoClient('mongodb://localhost:27017/')
+    db = client['legal_cases']
+    cases = db['cases']
+    
+    # Fit on a random sample of the float32 vectors
+    print(f"📥 Sampling up to {SAMPLE_SIZE:,} embeddings...")
+    sample = [
+        decode_embedding(case['embedding'])
+        for case in cases.aggregate([
+            {'$match': {'embedding': {'$exists': True}}},
+            {'$sample': {'size': SAMPLE_SIZE}},
+            {'$project': {'embedding': 1}}
+        ])
+    ]
+    
+    if len(sample) < TARGET_DIM:
+        print(f"❌ Need at least {TARGET_DIM} embeddings to fit the PCA, found {len(sample)}")
+        client.close()
+        return
+    
+    projection = EmbeddingProjection.fit(np.vstack(sample), TARGET_DIM)
+    db['meta'].replace_one({'_id': PROJECTION_ID}, projection.to_document(), upsert=True)
+    
+    print(f"✅ PCA fitted: {projection.input_dim} -> {projection.dim} dimensions")
+    
+    # Rewrite the int8 copies in the reduced space
+    count = cases.count_documents({'embedding': {'$exists': True}})
+    cursor = cases.find(
+        {'embedding': {'$exists': True}},
+        projection={'embedding': 1}
+    ).batch_size(BATCH_SIZE)
+    
+    ops = []
+    
+    for case in tqdm(cursor, total=count, desc="Reducing embeddings"):
+        quantized, scale = quantize_embedding(projection.project(decode_embedding(case['embedding'])))
+        ops.append(UpdateOne(
+            {'_id': case['_id']},
+            {'$set': {'embedding_q8': quantized, 'embedding_scale': scale}}
+        ))
+        
+        if len(ops) >= BATCH_SIZE:
+            cases.bulk_write(ops, ordered=False)
+            ops = []
+    
+    if ops:
+        cases.bulk_write(ops, ordered=False)
+    
+    print(f"\n✅ Reduced {count:,} embeddings to {TARGET_DIM} dimensions!")
+    
+    client.close()
+
+if __name__ == "__main__":
+    reduce_embeddings()
@@ -0,0 +1,78 @@
+import asyncio
+
+
+class QueryEmbeddingBatcher:
+    """
+    Coalesce query embeddings from concurrent requests into one
+    model forward pass.
+
+    Queries arriving within a short window (or until the batch is full)
+    are encoded together and each request gets back its own vector.
+    """
+
+    def __init__(self, encode_fn, max_batch_size=32, max_wait_ms=8):
+        """
+        Args:
+            encode_fn (callable): Blocking function mapping a list of
+                queries to a list/array of embeddings
+            max_batch_size (int): Most queries encoded in one call
+            max_wait_ms (float): How long to wait for more queries
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        """Start the background batching task (call inside the event loop)"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background task"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def embed(self, query):
+        """Queue a query and wait for its embedding"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            # Keep collecting until the batch is full or the window closes
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            queries = [query for query, _ in batch]
+
+            # Model inference is blocking, keep it off the event loop
+            try:
+                embeddings = await loop.run_in_executor(None, self.encode_fn, queries)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                # Skip requests that were cancelled while waiting
+                if not future.done():
+                    future.set_result(embedding)
@@ -9,6 +9,9 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.models.search import LegalCaseSearch
+from src.models.embeddings import cpu_thread_count
+from src.api.batching import QueryEmbeddingBatcher
+from config_loader import load_config
 
 # Initialize FastAPI
 app = FastAPI(
@@ -28,18 +31,31 @@ app.add_middleware(
 
 # Initialize search engine
 search_engine = None
+query_batcher = None
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize search engine on startup"""
-    global search_engine
+    global search_engine, query_batcher
     print("🚀 Starting Legal Case Search API...")
     search_engine = LegalCaseSearch()
+    await search_engine.build_index()
+
+    # Concurrent /search queries share one embedding forward pass
+    search_config = load_config()["search"]
+    query_batcher = QueryEmbeddingBatcher(
+        search_engine.encode_queries,
+        max_batch_size=search_config["query_batch_size"],
+        max_wait_ms=search_config["query_batch_wait_ms"]
+    )
+    query_batcher.start()
     print("✅ API Ready!")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
+    if query_batcher:
+        await query_batcher.stop()
     if search_engine:
         search_engine.close()
     print("👋 API Shutdown")
@@ -100,7 +116,7 @@ async def get_statistics():
     if not search_engine:
         raise HTTPException(status_code=500, detail="Search engine not initialized")
     
-    stats = search_engine.get_statistics()
+    stats = await search_engine.get_statistics()
     return stats
 
 @app.post("/search", response_model=SearchResponse)
@@ -124,10 +140,12 @@ async def search_cases(request: SearchRequest):
         if request.court:
             filters['court'] = {'$regex': request.court, '$options': 'i'}
         
-        results = search_engine.search_similar_cases(
+        # Not awaited here: the engine awaits it alongside the court filter query
+        results = await search_engine.search_similar_cases(
             query=request.query,
             top_k=request.top_k,
-            filters=filters if filters else None
+            filters=filters if filters else None,
+            query_embedding=query_batcher.embed(request.query)
         )
         
         return {
@@ -167,7 +185,7 @@ async def get_case_details(case_id: str):
     if not search_engine:
         raise HTTPException(status_code=500, detail="Search engine not initialized")
     
-    case = search_engine.get_case_details(case_id)
+    case = await search_engine.get_case_details(case_id)
     
     if not case:
         raise HTTPException(status_code=404, detail=f"Case {case_id} not found")
@@ -193,7 +211,7 @@ async def find_similar_cases(
         raise HTTPException(status_code=500, detail="Search engine not initialized")
     
     try:
-        results = search_engine.search_by_case_id(case_id, top_k)
+        results = await search_engine.search_by_case_id(case_id, top_k)
         
         if not results:
             raise HTTPException(
@@ -213,4 +231,20 @@ async def find_similar_cases(
 # Run the API
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+
+    api_config = load_config()["api"]
+
+    # Split the cores between workers; spawned workers inherit these
+    # before they import torch/numpy, so BLAS and OpenMP pools match
+    threads = str(cpu_thread_count(api_config["workers"]))
+    os.environ.setdefault("OMP_NUM_THREADS", threads)
+    os.environ.setdefault("MKL_NUM_THREADS", threads)
+
+    # Each worker is a separate process with its own search engine and model;
+    # an import string is required for uvicorn to spawn them
+    uvicorn.run(
+        "src.api.main:app",
+        host=api_config["host"],
+        port=api_config["port"],
+        workers=api_config["workers"]
+    )
\ No newline at end of file
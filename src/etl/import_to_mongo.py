@@ -1,6 +1,10 @@
 import os
-import json
-from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import orjson
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 from tqdm import tqdm
 
 # ===== MongoDB Connection =====
@@ -11,27 +15,88 @@ collection = db["cases"]
 # ===== JSON Folder =====
 JSON_FOLDER = "data/processed/extracted_json"
 
+# Upserts sent to MongoDB per bulk_write round-trip
+BATCH_SIZE = 1000
+
+# Threads reading JSON files (file reads are I/O-latency bound)
+READ_WORKERS = 16
+
+def load_json(file):
+    """Read one JSON file, returning (file, data, error)"""
+    try:
+        data = orjson.loads(Path(JSON_FOLDER, file).read_bytes())
+        # e.g. extraction_errors.json is a list, not a case document
+        if not isinstance(data, dict):
+            raise ValueError("not a case document")
+        return file, data, None
+    except Exception as e:
+        return file, None, e
+
+def flush(ops):
+    """Send queued upserts in one unordered bulk_write"""
+    if ops:
+        try:
+            collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: the rest of the batch is still written
+            print(f"❌ Failed: {len(e.details['writeErrors'])} upserts in batch")
+        ops.clear()
+
+def read_all(executor, files):
+    """
+    Yield load_json results in file order, BATCH_SIZE files at a time, so
+    at most two batches of parsed documents are held in memory when the
+    writer falls behind the readers
+    """
+    batches = (files[i:i + BATCH_SIZE] for i in range(0, len(files), BATCH_SIZE))
+    pending = None
+    for batch in batches:
+        # Read the next batch while the previous one is being written
+        submitted = [executor.submit(load_json, file) for file in batch]
+        if pending:
+            for future in pending:
+                yield future.result()
+        pending = submitted
+    if pending:
+        for future in pending:
+            yield future.result()
+
 def import_all_json():
     files = [f for f in os.listdir(JSON_FOLDER) if f.endswith(".json")]
 
     print(f"📂 Total JSON files found: {len(files)}")
 
-    for file in tqdm(files, desc="Importing to MongoDB"):
-        file_path = os.path.join(JSON_FOLDER, file)
+    # Index case_id once so each upsert is an index lookup, not a collection scan.
+    # Same spec as CaseEmbeddingGenerator._create_embedding_index
+    try:
+        collection.create_index("case_id", unique=True)
+    except OperationFailure as e:
+        # e.g. a non-unique case_id_1 left by an older embedding run;
+        # it still serves the upsert lookups
+        print(f"⚠️ Index creation warning: {e}")
 
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+    ops = []
+
+    # Reader threads load files concurrently; this thread is the only writer
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        results = read_all(executor, files)
+
+        for file, data, error in tqdm(results, total=len(files), desc="Importing to MongoDB"):
+            if error is not None:
+                print(f"❌ Failed: {file} → {error}")
+                continue
 
             # Avoid duplicates using case_id
-            collection.update_one(
+            ops.append(UpdateOne(
                 {"case_id": data.get("case_id")},
                 {"$set": data},
                 upsert=True
-            )
+            ))
+
+            if len(ops) >= BATCH_SIZE:
+                flush(ops)
 
-        except Exception as e:
-            print(f"❌ Failed: {file} → {e}")
+    flush(ops)
 
     print("✅ All JSON files imported successfully!")
 
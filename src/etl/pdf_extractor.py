@@ -1,15 +1,91 @@
 import os
 import json
 import re
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
 import PyPDF2
 import pdfplumber
 import fitz  # PyMuPDF
+import orjson
 from tqdm import tqdm
 
 
+# Precompiled patterns (shared by every document)
+_WS = re.compile(r"\s+")
+_NON_ASCII = re.compile(r"[^\w\s\.,;:\-\(\)\[\]/\'\"]")
+# Same character filter as _NON_ASCII, as a str.translate table for ASCII text
+_ASCII_STRIP = str.maketrans("", "", "".join(
+    c for c in map(chr, range(128))
+    if not (c.isalnum() or c == "_" or c.isspace() or c in " .,;:-()[]/'\"")
+))
+_PAGE = re.compile(r"Page \d+")
+# Case title ("X vs Y"), looked for in the first 1000 characters only
+_TITLE = re.compile(r"([A-Z][A-Za-z\s]+)\s+(?:vs?\.?|versus)\s+([A-Z][A-Za-z\s]+)")
+# Dates and bench in one alternation so the document header is scanned in
+# a single pass; match.lastgroup tells which field matched. The branches
+# start with different characters (D/J, a digit, B/C), so no branch can
+# hide another's match at the same position
+_META = re.compile(
+    r"(?P<decided>(?:Decided on|Judgment dated)[\s:]+(?P<decided_date>\d{1,2}[-/]\d{1,2}[-/]\d{4}))"
+    r"|(?P<date>\d{1,2}\s+(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{4})"
+    r"|(?P<bench>(?:BENCH|CORAM)[\s:]+(?P<bench_text>.+?)(?:\n|JUDGMENT))",
+    re.IGNORECASE
+)
+# SCC and AIR citations in one alternation, so each slice is scanned once
+_CITATION = re.compile(r"(?:\(\d{4}\)\s+\d+\s+SCC\s+\d+)|(?:AIR\s+\d{4}\s+SC\s+\d+)")
+# Citations are looked for in this many characters at each end of the text
+_CITATION_WINDOW = 4000
+
+def _iter_pdfs(root):
+    """
+    Recursively yield os.DirEntry objects for PDFs under root.
+    Uses os.scandir directly instead of building a Path per file.
+    """
+    stack = [str(root)]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".pdf"):
+                    yield entry
+
+
+# Text-quality heuristics for choosing between extraction libraries
+MIN_WORDS = 200           # Below this a document is rejected
+TRUSTED_WORDS = 500       # PyMuPDF output this long is accepted as-is
+MIN_WORDS_PER_PAGE = 50   # Sparser text suggests a scanned/badly encoded PDF
+
+# Per-process extractor used by the worker pool (set by _init_worker)
+_worker_extractor = None
+
+
+def _init_worker(pdf_folder, output_folder):
+    """
+    Runs once in each worker process so PyMuPDF/pdfplumber are imported
+    and the extractor is built once per worker, not once per PDF.
+    """
+    global _worker_extractor
+    _worker_extractor = PDFExtractor(pdf_folder, output_folder)
+
+
+def _extract_one(pdf_path):
+    """
+    Extract a single PDF inside a worker process.
+
+    Returns:
+        tuple: (file name, extraction method or None, error message or None)
+    """
+    pdf_path = Path(pdf_path)
+    try:
+        method = _worker_extractor._extract_single_pdf(pdf_path)
+        return pdf_path.name, method, None
+    except Exception as e:
+        return pdf_path.name, None, str(e)
+
+
 class PDFExtractor:
     """
     Extract text and metadata from legal PDF documents.
@@ -29,21 +105,44 @@ class PDFExtractor:
         self.stats = {
             "total": 0,
             "successful": 0,
+            "skipped": 0,
             "failed": 0,
+            "methods": {},
             "errors": []
         }
 
-    def extract_all_pdfs(self, limit=None):
+    def extract_all_pdfs(self, limit=None, workers=None, skip_existing=True):
         """
         Extract text from all PDFs in the folder.
 
         Args:
             limit (int | None): Number of PDFs to process (None = all)
+            workers (int | None): Worker processes (None = all CPU cores)
+            skip_existing (bool): Skip PDFs that already have a JSON output
+                (safe for resuming; False re-extracts everything)
         """
-        pdf_files = list(self.pdf_folder.rglob("*.pdf"))
+        existing = set()
+        if skip_existing:
+            existing = {
+                name[:-len(".json")]
+                for name in os.listdir(self.output_folder)
+                if name.endswith(".json")
+            }
+
+        # (size, path) pairs; paths stay plain strings until a worker opens them
+        pdf_files = []
+        for entry in _iter_pdfs(self.pdf_folder):
+            if entry.name[:-len(".pdf")] in existing:
+                self.stats["skipped"] += 1
+                continue
+            pdf_files.append((entry.stat().st_size, entry.path))
+            if limit and len(pdf_files) >= limit:
+                break
 
-        if limit:
-            pdf_files = pdf_files[:limit]
+        # Largest files first so long judgments start early instead of
+        # leaving one worker busy at the tail while the others sit idle
+        pdf_files.sort(reverse=True)
+        pdf_files = [path for _, path in pdf_files]
 
         self.stats["total"] = len(pdf_files)
 
@@ -52,27 +151,45 @@ class PDFExtractor:
         print("=" * 70)
         print(f"📂 Source folder : {self.pdf_folder}")
         print(f"💾 Output folder : {self.output_folder}")
+        print(f"⏭️  Already extracted: {self.stats['skipped']}")
         print(f"📊 PDFs to process: {len(pdf_files)}")
+
+        workers = workers or os.cpu_count() or 1
+        print(f"⚙️  Worker processes: {workers}")
         print("=" * 70 + "\n")
 
-        for pdf_file in tqdm(pdf_files, desc="Extracting PDFs", unit="file"):
-            try:
-                self._extract_single_pdf(pdf_file)
-                self.stats["successful"] += 1
-            except Exception as e:
-                self.stats["failed"] += 1
-                self.stats["errors"].append({
-                    "file": pdf_file.name,
-                    "error": str(e)
-                })
-                print(f"\n❌ Failed: {pdf_file.name} → {e}")
+        # PDF parsing is CPU-bound, so fan out across processes
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.pdf_folder, self.output_folder)
+        ) as executor:
+            results = executor.map(_extract_one, pdf_files, chunksize=8)
+
+            for name, method, error in tqdm(results, total=len(pdf_files),
+                                            desc="Extracting PDFs", unit="file"):
+                if error is None:
+                    self.stats["successful"] += 1
+                    methods = self.stats["methods"]
+                    methods[method] = methods.get(method, 0) + 1
+                else:
+                    self.stats["failed"] += 1
+                    self.stats["errors"].append({
+                        "file": name,
+                        "error": error
+                    })
+                    print(f"\n❌ Failed: {name} → {error}")
 
         self._print_statistics()
         self._save_error_log()
 
     def _extract_single_pdf(self, pdf_path):
         """
-        Extract text from a single PDF using multiple fallback methods.
+        Extract text from a single PDF, falling back to slower libraries
+        only when the PyMuPDF result looks unusable.
+
+        Returns:
+            str: Name of the extraction method that produced the text
         """
         case_data = {
             "pdf_filename": pdf_path.name,
@@ -82,32 +199,34 @@ class PDFExtractor:
 
         text = None
         method_used = None
+        page_count = None
 
-        # Method 1: PyMuPDF (fastest)
+        # Method 1: PyMuPDF (fastest, also gives us the page count)
         try:
-            text = self._extract_with_pymupdf(pdf_path)
+            text, page_count = self._extract_with_pymupdf(pdf_path)
             method_used = "pymupdf"
         except Exception:
             pass
 
-        # Method 2: pdfplumber
-        if not text or len(text.split()) < 200:
-            try:
-                text = self._extract_with_pdfplumber(pdf_path)
-                method_used = "pdfplumber"
-            except Exception:
-                pass
-
-        # Method 3: PyPDF2
-        if not text or len(text.split()) < 200:
+        # Methods 2 and 3: pdfplumber, then PyPDF2. A fallback only replaces
+        # the current text when it recovers more words.
+        fallbacks = [
+            ("pdfplumber", self._extract_with_pdfplumber),
+            ("pypdf2", self._extract_with_pypdf2)
+        ]
+        for method, extract in fallbacks:
+            if not self._needs_fallback(text, page_count):
+                break
             try:
-                text = self._extract_with_pypdf2(pdf_path)
-                method_used = "pypdf2"
+                candidate = extract(pdf_path)
             except Exception:
-                pass
+                continue
+            if self._word_count(candidate) > self._word_count(text):
+                text = candidate
+                method_used = method
 
         # ✅ Final success condition
-        if not text or len(text.split()) < 200:
+        if not text or len(text.split()) < MIN_WORDS:
             raise Exception("Insufficient extracted text")
 
         case_data["raw_text"] = text
@@ -119,18 +238,43 @@ class PDFExtractor:
 
         case_data["word_count"] = len(case_data["cleaned_text"].split())
         case_data["char_count"] = len(case_data["cleaned_text"])
-        case_data["page_count"] = self._get_page_count(pdf_path)
+        # Only reopen the PDF for a page count if PyMuPDF could not read it
+        if page_count is None:
+            page_count = self._get_page_count(pdf_path)
+        case_data["page_count"] = page_count
 
+        # Write to a temp file and rename, so a crash never leaves a partial
+        # JSON behind (skip_existing would otherwise treat it as done)
         output_file = self.output_folder / f"{case_data['case_id']}.json"
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(case_data, f, ensure_ascii=False, indent=2)
+        tmp_file = output_file.with_suffix(".json.tmp")
+        tmp_file.write_bytes(orjson.dumps(case_data, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_file, output_file)
+
+        return method_used
+
+    def _needs_fallback(self, text, page_count):
+        """
+        Decide whether another library is worth a full re-parse.
+
+        Long text is trusted. Short text is only retried when it is sparse
+        for the page count (the signature of scanned or badly encoded
+        PDFs); a genuinely short order would come out the same again.
+        """
+        if not text:
+            return True
+
+        words = len(text.split())
+        if words >= TRUSTED_WORDS:
+            return False
+
+        return words < MIN_WORDS_PER_PAGE * max(page_count or 1, 1)
+
+    def _word_count(self, text):
+        return len(text.split()) if text else 0
 
     def _extract_with_pymupdf(self, pdf_path):
-        text = ""
         with fitz.open(pdf_path) as doc:
-            for page in doc:
-                text += page.get_text()
-        return text
+            return "".join(page.get_text() for page in doc), doc.page_count
 
     def _extract_with_pdfplumber(self, pdf_path):
         text = ""
@@ -160,9 +304,14 @@ class PDFExtractor:
             return 0
 
     def _clean_text(self, text):
-        text = re.sub(r"\s+", " ", text)
-        text = re.sub(r"[^\w\s\.,;:\-\(\)\[\]/\'\"]", "", text)
-        text = re.sub(r"Page \d+", "", text)
+        text = _WS.sub(" ", text)
+        # translate() is a plain C loop on pure-ASCII text but slower than the
+        # regex once any non-ASCII character is present
+        if text.isascii():
+            text = text.translate(_ASCII_STRIP)
+        else:
+            text = _NON_ASCII.sub("", text)
+        text = _PAGE.sub("", text)
         return text.strip()
 
     def _extract_metadata(self, text):
@@ -177,43 +326,46 @@ class PDFExtractor:
             "citations": []
         }
 
-        title_match = re.search(
-            r"([A-Z][A-Za-z\s]+)\s+(?:vs?\.?|versus)\s+([A-Z][A-Za-z\s]+)",
-            text[:1000]
-        )
+        # endpos: same result as searching text[:1000], without the copy
+        title_match = _TITLE.search(text, 0, 1000)
         if title_match:
             metadata["title"] = f"{title_match.group(1)} vs {title_match.group(2)}"
             metadata["petitioner"] = title_match.group(1).strip()
             metadata["respondent"] = title_match.group(2).strip()
 
-        date_patterns = [
-            r"(?:Decided on|Judgment dated)[\s:]+(\d{1,2}[-/]\d{1,2}[-/]\d{4})",
-            r"(\d{1,2}\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{4})"
-        ]
+        header = text[:2000]
+        decided_date = None
+        first_date = None
+        pos = 0
 
-        for pattern in date_patterns:
-            match = re.search(pattern, text[:2000], re.IGNORECASE)
-            if match:
-                metadata["date"] = match.group(1)
+        while True:
+            match = _META.search(header, pos)
+            if not match:
                 break
+            field = match.lastgroup
 
-        bench_match = re.search(
-            r"(?:BENCH|CORAM)[\s:]+(.+?)(?:\n|JUDGMENT)",
-            text[:2000],
-            re.IGNORECASE
-        )
-        if bench_match:
-            metadata["bench"] = bench_match.group(1).strip()
-
-        citation_patterns = [
-            r"\(\d{4}\)\s+\d+\s+SCC\s+\d+",
-            r"AIR\s+\d{4}\s+SC\s+\d+"
-        ]
+            # Matches may overlap (a bench line can contain the date), so
+            # resume just after this match's start, not after its end
+            pos = match.start() + 1
+
+            if field == "decided" and decided_date is None:
+                decided_date = match.group("decided_date")
+            elif field == "date" and first_date is None:
+                first_date = match.group("date")
+            elif field == "bench" and metadata["bench"] is None:
+                metadata["bench"] = match.group("bench_text").strip()
+
+            if decided_date and metadata["bench"]:
+                break
 
-        for pattern in citation_patterns:
-            metadata["citations"].extend(re.findall(pattern, text))
+        # An explicit "Decided on" date wins over the first date mentioned
+        metadata["date"] = decided_date or first_date
 
-        metadata["citations"] = list(set(metadata["citations"]))[:30]
+        # Head and tail of the judgment only; long bodies are not scanned
+        citations = set(_CITATION.findall(text[:_CITATION_WINDOW]))
+        if len(text) > _CITATION_WINDOW:
+            citations.update(_CITATION.findall(text[-_CITATION_WINDOW:]))
+        metadata["citations"] = list(citations)[:30]
         return metadata
 
     def _print_statistics(self):
@@ -222,7 +374,10 @@ class PDFExtractor:
         print("=" * 70)
         print(f"📊 Total PDFs : {self.stats['total']}")
         print(f"✅ Success    : {self.stats['successful']}")
+        print(f"⏭️  Skipped    : {self.stats['skipped']}")
         print(f"❌ Failed     : {self.stats['failed']}")
+        for method, count in sorted(self.stats["methods"].items()):
+            print(f"🔧 {method:<11}: {count}")
         print("=" * 70 + "\n")
 
     def _save_error_log(self):
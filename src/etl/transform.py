@@ -1,15 +1,40 @@
 import os
-from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer
+import sys
+import hashlib
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, UpdateOne, ReplaceOne
+from bson.binary import Binary
+from pymongo.errors import BulkWriteError
 import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
+from cachetools import LRUCache
 from datetime import datetime
 from dotenv import load_dotenv
 import time
 
+# Add project root to path (so the file also runs as a script)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from config_loader import load_config
+
+from src.models.embeddings import (
+    encode_embedding, decode_embedding, quantize_embedding,
+    get_device, load_sentence_model, EmbeddingProjection, PROJECTION_ID
+)
+
 # Load environment variables
 load_dotenv()
 
+# Pipeline progress goes through logging: per-case errors are DEBUG so a
+# corrupt corpus can't flood the output (they are still counted in stats)
+logger = logging.getLogger(__name__)
+
 class CaseEmbeddingGenerator:
     """
     Generate embeddings for legal cases using Sentence-BERT
@@ -24,6 +49,8 @@ class CaseEmbeddingGenerator:
         self.client = MongoClient(mongo_uri)
         self.db = self.client[db_name]
         self.cases_collection = self.db['cases']
+        self.tokens_collection = self.db['cases_tokens']
+        self.embedding_cache_collection = self.db['embedding_cache']
         
         print(f"✅ Connected to MongoDB: {db_name}")
         
@@ -32,44 +59,106 @@ class CaseEmbeddingGenerator:
         print("   Model: all-MiniLM-L6-v2 (Fast and efficient)")
         print("   This may take 1-2 minutes on first run...")
         
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        # GPU + FP16 when available, or the ONNX export (nlp.runtime: "onnx")
+        nlp_config = load_config()['nlp']
+        onnx_dir = nlp_config['onnx_model_dir'] if nlp_config['runtime'] == 'onnx' else None
+        self.device = get_device()
+        self.model = load_sentence_model('all-MiniLM-L6-v2', self.device, onnx_dir)
         # Alternatives: 'all-mpnet-base-v2' (better quality but slower)
         #               'paraphrase-multilingual-MiniLM-L12-v2' (for Hindi text)
         
-        print("✅ Model loaded successfully!")
+        # Model mini-batch: GPUs stay saturated with much larger batches than CPUs
+        self.encode_batch_size = 256 if self.device == 'cuda' else 64
+        
+        # Cases buffered per encode call; SBERT sorts each buffer by length,
+        # so a buffer much larger than the mini-batch means less padding
+        self.default_batch_size = 1024
+        
+        # Prepared batches read ahead of the model, so it never waits on MongoDB
+        self.prefetch_batches = 4
+        
+        # Token ids are cached in cases_tokens so regeneration runs
+        # (skip_existing=False) skip WordPiece (torch runtime only; the ONNX
+        # encoder tokenizes itself). A cached entry is reused only for the
+        # same tokenizer and text, so a model upgrade always re-tokenizes;
+        # first-pass runs tokenize without reading or writing the cache
+        self.use_token_cache = onnx_dir is None
+        self.cache_tokens = False
+        if self.use_token_cache:
+            tokenizer = self.model.tokenizer
+            self.tokenizer_key = f"{tokenizer.name_or_path}:{self.model.max_seq_length}"
+            self.token_dtype = np.uint16 if len(tokenizer) <= 65536 else np.uint32
+        
+        # Embeddings by blake2b of the prepared text: identical texts
+        # (procedural orders, cause-list templates) are encoded once.
+        # Recent ones are kept in memory, all of them in embedding_cache.
+        # Entries are tied to the model, runtime and precision that made them
+        self.embedding_cache = LRUCache(maxsize=50000)
+        self.embedding_cache_lock = threading.Lock()
+        if onnx_dir:
+            runtime = 'onnx'
+        else:
+            runtime = 'torch-fp16' if self.device == 'cuda' else 'torch-fp32'
+        self.embedding_cache_key = f"all-MiniLM-L6-v2:{runtime}"
+        self.reuse_stored_embeddings = True
+        
+        print(f"✅ Model loaded successfully! (device: {self.device})")
         
         self.embedding_dim = 384  # Dimension of all-MiniLM-L6-v2
         
+        # PCA from reduce_embeddings.py, if one was fitted: the int8 copies
+        # must stay in the same space as the rest of the index
+        self.projection = EmbeddingProjection.from_document(
+            self.db['meta'].find_one({'_id': PROJECTION_ID})
+        )
+        
         # Statistics
         self.stats = {
             'total': 0,
             'processed': 0,
             'skipped': 0,
+            'reused': 0,
             'failed': 0,
             'start_time': None,
             'end_time': None
         }
     
-    def generate_embeddings_batch(self, batch_size=32, limit=None, skip_existing=True):
+    def generate_embeddings_batch(self, batch_size=None, limit=None, skip_existing=True):
         """
         Generate embeddings for all cases in batches
         
         Args:
             batch_size (int): Number of cases to process at once
+                (None = 1024)
             limit (int): Limit number of cases (None for all)
             skip_existing (bool): Skip cases that already have embeddings
         """
-        print("\n" + "="*70)
-        print("EMBEDDING GENERATION PIPELINE")
-        print("="*70)
+        logger.info("="*70)
+        logger.info("EMBEDDING GENERATION PIPELINE")
+        logger.info("="*70)
+        
+        batch_size = batch_size or self.default_batch_size
+        
+        # Indexes first, so the skip_existing query below is an index lookup
+        self._create_embedding_index()
         
         # Query for cases without embeddings (if skip_existing)
+        # embedding_generated_at is set together with embedding and is indexed;
+        # indexing the vector itself would add 384 keys per case
         if skip_existing:
-            query = {"embedding": {"$exists": False}}
-            print("📊 Mode: Processing only cases without embeddings")
+            query = {"embedding_generated_at": {"$exists": False}}
+            logger.info("📊 Mode: Processing only cases without embeddings")
         else:
             query = {}
-            print("📊 Mode: Regenerating all embeddings")
+            logger.info("📊 Mode: Regenerating all embeddings")
+        
+        # Regenerating means encoding again: only texts repeated within
+        # this run are deduplicated, stored embeddings are not reused
+        self.reuse_stored_embeddings = skip_existing
+        self.cache_tokens = not skip_existing
+        if not skip_existing:
+            with self.embedding_cache_lock:
+                self.embedding_cache.clear()
         
         # Count total cases to process
         total_cases = self.cases_collection.count_documents(query)
@@ -80,57 +169,126 @@ class CaseEmbeddingGenerator:
         self.stats['total'] = total_cases
         self.stats['start_time'] = datetime.now()
         
-        print(f"📊 Total cases to process: {total_cases:,}")
-        print(f"📦 Batch size: {batch_size}")
-        print(f"⏰ Started at: {self.stats['start_time'].strftime('%Y-%m-%d %H:%M:%S')}")
-        print("="*70 + "\n")
+        logger.info(f"📊 Total cases to process: {total_cases:,}")
+        logger.info(f"📦 Batch size: {batch_size}")
+        logger.info(f"⏰ Started at: {self.stats['start_time'].strftime('%Y-%m-%d %H:%M:%S')}")
+        logger.info("="*70)
         
         if total_cases == 0:
-            print("✅ All cases already have embeddings!")
+            logger.info("✅ All cases already have embeddings!")
             return
         
-        # Process in batches
-        cursor = self.cases_collection.find(query).limit(limit) if limit else self.cases_collection.find(query)
-        
-        batch_texts = []
-        batch_ids = []
-        
-        with tqdm(total=total_cases, desc="Generating embeddings", unit="case") as pbar:
-            for case in cursor:
-                try:
-                    # Get text to embed
-                    text = self._prepare_text_for_embedding(case)
+        # Process in batches (only the fields used to build the text,
+        # already truncated by the server)
+        pipeline = [{'$match': query}]
+        if limit:
+            pipeline.append({'$limit': limit})
+        pipeline.append(self._prepared_fields_stage())
+        cursor = self.cases_collection.aggregate(pipeline, batchSize=1000)
+        
+        # Pipeline: a reader thread prepares batches from the cursor, this
+        # thread runs the model, and a writer thread saves the previous
+        # batch to MongoDB while the next one is being encoded
+        batches = queue.Queue(maxsize=self.prefetch_batches)
+        stop = threading.Event()
+        pending = deque()
+        
+        # Redraw at most once a second, not after every batch
+        with tqdm(total=total_cases, desc="Generating embeddings", unit="case",
+                  mininterval=1.0) as pbar, \
+                ThreadPoolExecutor(max_workers=1) as reader, \
+                ThreadPoolExecutor(max_workers=1) as writer:
+            read_future = reader.submit(self._read_batches, cursor, batch_size, batches, stop)
+            try:
+                while (batch := batches.get()) is not None:
+                    texts, hashes, owners, token_ids, token_ops, reused, skipped, failed = batch
+                    self.stats['skipped'] += skipped
+                    self.stats['failed'] += failed
+                    pbar.update(skipped + failed)
                     
-                    if not text or len(text.strip()) < 50:
-                        self.stats['skipped'] += 1
-                        pbar.update(1)
+                    # Cases whose text was embedded before, then the new texts
+                    case_ids, embeddings = reused
+                    self.stats['reused'] += len(case_ids)
+                    new_entries = []
+                    
+                    if texts:
+                        encoded = self._encode_batch(texts, token_ids)
+                        if encoded is None:
+                            lost = sum(len(text_owners) for text_owners in owners)
+                            self.stats['failed'] += lost
+                            pbar.update(lost)
+                        else:
+                            with self.embedding_cache_lock:
+                                for text_hash, embedding in zip(hashes, encoded):
+                                    # Copy, so the LRU doesn't pin whole batch arrays
+                                    self.embedding_cache[text_hash] = embedding.copy()
+                            new_entries = list(zip(hashes, encoded))
+                            
+                            # Duplicates within the batch share one encoding
+                            for text_owners, embedding in zip(owners, encoded):
+                                case_ids.extend(text_owners)
+                                embeddings.extend([embedding] * len(text_owners))
+                                self.stats['reused'] += len(text_owners) - 1
+                    
+                    if not case_ids:
                         continue
                     
-                    batch_texts.append(text)
-                    batch_ids.append(case['_id'])
+                    pending.append(writer.submit(
+                        self._write_batch, case_ids, np.array(embeddings), token_ops, new_entries
+                    ))
                     
-                    # Process batch when full
-                    if len(batch_texts) >= batch_size:
-                        self._process_batch(batch_texts, batch_ids)
-                        batch_texts = []
-                        batch_ids = []
-                        pbar.update(batch_size)
+                    # At most one write in flight behind the model
+                    while len(pending) > 1:
+                        self._finish_write(pending.popleft(), pbar)
                 
-                except Exception as e:
-                    self.stats['failed'] += 1
-                    print(f"\n❌ Error processing case {case.get('case_id', 'unknown')}: {e}")
-                    pbar.update(1)
+                while pending:
+                    self._finish_write(pending.popleft(), pbar)
+                
+                # Surface cursor errors from the reader
+                read_future.result()
             
-            # Process remaining cases
-            if batch_texts:
-                self._process_batch(batch_texts, batch_ids)
-                pbar.update(len(batch_texts))
+            finally:
+                # On errors, unblock the reader so the executors can shut down
+                stop.set()
+                while not read_future.done():
+                    try:
+                        batches.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
         
         self.stats['end_time'] = datetime.now()
         self._print_statistics()
-        
-        # Create index for faster similarity search
-        self._create_embedding_index()
+    
+    def _prepared_fields_stage(self):
+        """
+        $project stage returning just what _prepare_text_for_embedding
+        reads, with long fields cut server-side so whole judgments never
+        cross the wire. Only the first 5000 characters of the combined
+        text are kept, so nothing past that can matter: summary is cut
+        at 5000, and the body text at 8000 code points (slack for
+        whitespace the word split collapses). $substrCP, unlike
+        $substrBytes, never splits a UTF-8 character.
+        The body text comes back as cleaned_text, falling back to
+        judgment_text like the Python code does.
+        """
+        return {'$project': {
+            'case_id': 1,
+            'title': 1,
+            'court': 1,
+            'summary': {'$substrCP': [{'$ifNull': ['$summary', '']}, 0, 5000]},
+            'cleaned_text': {'$substrCP': [
+                {'$let': {
+                    'vars': {'cleaned': {'$ifNull': ['$cleaned_text', '']}},
+                    'in': {'$cond': [
+                        {'$ne': ['$$cleaned', '']},
+                        '$$cleaned',
+                        {'$ifNull': ['$judgment_text', '']}
+                    ]}
+                }},
+                0,
+                8000
+            ]}
+        }}
     
     def _prepare_text_for_embedding(self, case):
         """
@@ -152,8 +310,10 @@ class CaseEmbeddingGenerator:
         # Add main judgment text (truncated to avoid very long texts)
         text = case.get('cleaned_text') or case.get('judgment_text', '')
         if text:
-            # Take first 2000 words (balance between context and speed)
-            words = text.split()[:2000]
+            # Take first 2000 words (balance between context and speed).
+            # maxsplit stops after them instead of splitting the whole
+            # judgment; the last item is the unsplit remainder
+            words = text.split(None, 2000)[:2000]
             parts.append(' '.join(words))
         
         # Add metadata for better matching
@@ -170,51 +330,317 @@ class CaseEmbeddingGenerator:
         
         return combined_text
     
-    def _process_batch(self, texts, case_ids):
+    def _read_batches(self, cursor, batch_size, batches, stop):
         """
-        Generate embeddings for a batch of texts and save to MongoDB
+        Reader thread: build embedding texts from the cursor and queue
+        them in batches (see _queue_batch), then None
         """
+        texts, case_ids, skipped, failed = [], [], 0, 0
         try:
-            # Generate embeddings
-            embeddings = self.model.encode(
-                texts,
-                batch_size=len(texts),
-                show_progress_bar=False,
-                convert_to_numpy=True
-            )
+            for case in cursor:
+                if stop.is_set():
+                    return
+                
+                try:
+                    # Get text to embed
+                    text = self._prepare_text_for_embedding(case)
+                    
+                    if not text or len(text.strip()) < 50:
+                        skipped += 1
+                    else:
+                        texts.append(text)
+                        case_ids.append(case['_id'])
+                
+                except Exception as e:
+                    failed += 1
+                    # Lazy formatting: nothing is built unless DEBUG is on
+                    logger.debug("❌ Error processing case %s: %s", case.get('case_id', 'unknown'), e)
+                
+                # Hand the batch over when full
+                if len(texts) >= batch_size:
+                    self._queue_batch(batches, texts, case_ids, skipped, failed)
+                    texts, case_ids, skipped, failed = [], [], 0, 0
             
-            # Save to MongoDB
-            for case_id, embedding in zip(case_ids, embeddings):
-                self.cases_collection.update_one(
+            # Remaining cases
+            if texts or skipped or failed:
+                self._queue_batch(batches, texts, case_ids, skipped, failed)
+        
+        finally:
+            batches.put(None)
+    
+    def _queue_batch(self, batches, texts, case_ids, skipped, failed):
+        """
+        Deduplicate a batch by text hash and tokenize what still needs
+        encoding (in the reader thread, so it overlaps the model).
+        
+        Queued as (texts, hashes, owners, token_ids, token_ops, reused,
+        skipped, failed): the distinct new texts with their hashes and
+        the case ids sharing each, and (case_ids, embeddings) for cases
+        whose text already has an embedding
+        """
+        hashes = [self._text_hash(text) for text in texts]
+        known = self._cached_embeddings(set(hashes))
+        
+        unique_texts, unique_hashes, owners = [], [], []
+        position = {}
+        reused_ids, reused = [], []
+        for text, text_hash, case_id in zip(texts, hashes, case_ids):
+            if text_hash in known:
+                reused_ids.append(case_id)
+                reused.append(known[text_hash])
+            elif text_hash in position:
+                owners[position[text_hash]].append(case_id)
+            else:
+                position[text_hash] = len(unique_texts)
+                unique_texts.append(text)
+                unique_hashes.append(text_hash)
+                owners.append([case_id])
+        
+        token_ids, token_ops = None, []
+        if self.use_token_cache and unique_texts:
+            try:
+                token_ids, token_ops = self._tokenize_batch(
+                    unique_texts, [text_owners[0] for text_owners in owners], unique_hashes
+                )
+            except Exception as e:
+                # The model can still tokenize the texts itself
+                logger.warning(f"⚠️ Token cache unavailable for this batch: {e}")
+        
+        batches.put((
+            unique_texts, unique_hashes, owners, token_ids, token_ops,
+            (reused_ids, reused), skipped, failed
+        ))
+    
+    @staticmethod
+    def _text_hash(text):
+        """128-bit blake2b digest of a prepared text"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+    
+    def _cached_embeddings(self, hashes):
+        """
+        Embeddings already computed for these text hashes, from memory
+        or (unless regenerating) the embedding_cache collection
+        
+        Returns:
+            dict: text hash -> embedding
+        """
+        with self.embedding_cache_lock:
+            known = {
+                text_hash: self.embedding_cache[text_hash]
+                for text_hash in hashes if text_hash in self.embedding_cache
+            }
+        
+        missing = [text_hash for text_hash in hashes if text_hash not in known]
+        if missing and self.reuse_stored_embeddings:
+            try:
+                for doc in self.embedding_cache_collection.find(
+                    {'_id': {'$in': missing}, 'model': self.embedding_cache_key}
+                ):
+                    known[doc['_id']] = decode_embedding(doc['embedding'])
+            except Exception as e:
+                # Only a cache: those texts get encoded again
+                logger.warning(f"⚠️ Embedding cache unavailable for this batch: {e}")
+        
+        return known
+    
+    def _tokenize_batch(self, texts, case_ids, hashes):
+        """
+        Token ids for a batch: from cases_tokens when they were made by
+        the same tokenizer from the same text (blake2b of the text),
+        otherwise tokenized now with the fast tokenizer. cases_tokens is
+        only used when regenerating (self.cache_tokens)
+        
+        Returns:
+            tuple: (list of unpadded id arrays, cases_tokens upserts)
+        """
+        cached = {}
+        if self.cache_tokens:
+            cached = {
+                doc['_id']: doc
+                for doc in self.tokens_collection.find({'_id': {'$in': case_ids}})
+            }
+        
+        token_ids = [None] * len(texts)
+        missing = []
+        for i, (case_id, text_hash) in enumerate(zip(case_ids, hashes)):
+            doc = cached.get(case_id)
+            if doc and doc['tokenizer'] == self.tokenizer_key and doc['text_hash'] == text_hash:
+                token_ids[i] = np.frombuffer(doc['input_ids'], dtype=self.token_dtype)
+            else:
+                missing.append(i)
+        
+        ops = []
+        if missing:
+            # Same settings SentenceTransformer.encode tokenizes with
+            encoded = self.model.tokenizer(
+                [texts[i].strip() for i in missing],
+                truncation='longest_first',
+                max_length=self.model.max_seq_length
+            )['input_ids']
+            for i, ids in zip(missing, encoded):
+                token_ids[i] = np.asarray(ids, dtype=self.token_dtype)
+                if not self.cache_tokens:
+                    continue
+                ops.append(ReplaceOne(
+                    {'_id': case_ids[i]},
+                    {
+                        'tokenizer': self.tokenizer_key,
+                        'text_hash': Binary(hashes[i]),
+                        'input_ids': Binary(token_ids[i].tobytes())
+                    },
+                    upsert=True
+                ))
+        
+        return token_ids, ops
+    
+    def _encode_token_ids(self, token_ids):
+        """
+        Run the SBERT modules on unpadded token id arrays, longest first
+        so each mini-batch pads to similar lengths
+        """
+        pad_id = self.model.tokenizer.pad_token_id
+        order = np.argsort([-len(ids) for ids in token_ids], kind='stable')
+        embeddings = np.empty((len(token_ids), self.embedding_dim), dtype=np.float32)
+        
+        for start in range(0, len(order), self.encode_batch_size):
+            rows = order[start:start + self.encode_batch_size]
+            length = len(token_ids[rows[0]])
+            
+            input_ids = np.full((len(rows), length), pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(rows), length), dtype=np.int64)
+            for i, row in enumerate(rows):
+                input_ids[i, :len(token_ids[row])] = token_ids[row]
+                attention_mask[i, :len(token_ids[row])] = 1
+            
+            features = {
+                'input_ids': torch.from_numpy(input_ids).to(self.device),
+                'attention_mask': torch.from_numpy(attention_mask).to(self.device)
+            }
+            output = self.model(features)['sentence_embedding'].float()
+            embeddings[rows] = torch.nn.functional.normalize(output, dim=1).cpu().numpy()
+        
+        return embeddings
+    
+    def _encode_batch(self, texts, token_ids=None):
+        """
+        Generate embeddings for a batch, from token ids when the reader
+        produced them, else from the texts (None on failure)
+        """
+        try:
+            if token_ids is not None:
+                with torch.inference_mode():
+                    return self._encode_token_ids(token_ids)
+            
+            # Unit length, so search can use dot products. A mini-batch
+            # smaller than len(texts) lets SBERT sort the texts by length
+            # so each mini-batch pads to similar lengths
+            with torch.inference_mode():
+                return self.model.encode(
+                    texts,
+                    batch_size=self.encode_batch_size,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True
+                )
+        
+        except Exception as e:
+            logger.error(f"❌ Batch encoding error: {e}")
+            return None
+    
+    def _write_batch(self, case_ids, embeddings, token_ops=None, cache_entries=None):
+        """
+        Writer thread: save a batch of embeddings (and newly tokenized
+        cases and newly encoded (hash, embedding) pairs to the caches)
+        to MongoDB
+        
+        Returns:
+            tuple: (cases written, cases failed)
+        """
+        if token_ops:
+            try:
+                self.tokens_collection.bulk_write(token_ops, ordered=False)
+            except Exception as e:
+                # Only a cache: those cases get tokenized again next run
+                logger.warning(f"⚠️ Token cache write error: {e}")
+        
+        if cache_entries:
+            try:
+                self.embedding_cache_collection.bulk_write([
+                    ReplaceOne(
+                        {'_id': text_hash},
+                        {'model': self.embedding_cache_key, 'embedding': encode_embedding(embedding)},
+                        upsert=True
+                    )
+                    for text_hash, embedding in cache_entries
+                ], ordered=False)
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding cache write error: {e}")
+        
+        try:
+            # Save to MongoDB in one round-trip. The int8 copy (PCA-reduced
+            # when a projection exists) is what the search service loads
+            # into memory; the float32 vector stays the source of truth
+            # (and the field Atlas indexes)
+            reduced = self.projection.project(embeddings) if self.projection else embeddings
+            generated_at = datetime.now()
+            ops = []
+            for case_id, embedding, small in zip(case_ids, embeddings, reduced):
+                quantized, scale = quantize_embedding(small)
+                ops.append(UpdateOne(
                     {'_id': case_id},
                     {
                         '$set': {
-                            'embedding': embedding.tolist(),
+                            'embedding': encode_embedding(embedding),
+                            'embedding_q8': quantized,
+                            'embedding_scale': scale,
                             'embedding_model': 'all-MiniLM-L6-v2',
                             'embedding_dim': self.embedding_dim,
-                            'embedding_generated_at': datetime.now()
+                            'embedding_generated_at': generated_at
                         }
                     }
-                )
-            
-            self.stats['processed'] += len(texts)
-            
+                ))
+            self.cases_collection.bulk_write(ops, ordered=False)
+            return len(case_ids), 0
+        
+        except BulkWriteError as e:
+            # Unordered: every update except the reported ones was applied
+            failed = len(e.details['writeErrors'])
+            logger.error(f"❌ Batch write error: {failed} of {len(case_ids)} updates failed")
+            return len(case_ids) - failed, failed
+        
         except Exception as e:
-            print(f"\n❌ Batch processing error: {e}")
-            self.stats['failed'] += len(texts)
+            logger.error(f"❌ Batch write error: {e}")
+            return 0, len(case_ids)
+    
+    def _finish_write(self, future, pbar):
+        """Wait for a submitted write and record its outcome"""
+        written, failed = future.result()
+        self.stats['processed'] += written
+        self.stats['failed'] += failed
+        pbar.update(written + failed)
     
     def _create_embedding_index(self):
         """
-        Create index on case_id for faster lookups
+        Create index on case_id for faster lookups, and on
+        embedding_generated_at for finding cases without embeddings
         (Vector indexes for similarity search will be created later)
         """
-        print("\n🔧 Creating database indexes...")
-        try:
-            self.cases_collection.create_index('case_id')
-            self.cases_collection.create_index('embedding_generated_at')
-            print("✅ Indexes created successfully")
-        except Exception as e:
-            print(f"⚠️ Index creation warning: {e}")
+        logger.info("🔧 Creating database indexes...")
+        
+        # Same case_id spec as import_to_mongo.py (a same-named index with
+        # other options is rejected). Each index separately, so one
+        # conflict can't stop the others
+        indexes = [
+            ('case_id', {'unique': True}),
+            ('embedding_generated_at', {}),
+        ]
+        for field, options in indexes:
+            try:
+                self.cases_collection.create_index(field, **options)
+            except Exception as e:
+                logger.warning(f"⚠️ Index creation warning ({field}): {e}")
+        
+        logger.info("✅ Indexes checked")
     
     def _print_statistics(self):
         """
@@ -225,24 +651,25 @@ class CaseEmbeddingGenerator:
         minutes = int((duration % 3600) // 60)
         seconds = int(duration % 60)
         
-        print("\n" + "="*70)
-        print("EMBEDDING GENERATION COMPLETE!")
-        print("="*70)
-        print(f"📊 Total cases: {self.stats['total']:,}")
-        print(f"✅ Successfully processed: {self.stats['processed']:,}")
-        print(f"⏭️  Skipped (too short): {self.stats['skipped']:,}")
-        print(f"❌ Failed: {self.stats['failed']:,}")
+        logger.info("="*70)
+        logger.info("EMBEDDING GENERATION COMPLETE!")
+        logger.info("="*70)
+        logger.info(f"📊 Total cases: {self.stats['total']:,}")
+        logger.info(f"✅ Successfully processed: {self.stats['processed']:,}")
+        logger.info(f"⏭️  Skipped (too short): {self.stats['skipped']:,}")
+        logger.info(f"♻️  Reused (duplicate text): {self.stats['reused']:,}")
+        logger.info(f"❌ Failed: {self.stats['failed']:,}")
         
         if self.stats['processed'] > 0:
             success_rate = (self.stats['processed'] / self.stats['total']) * 100
-            print(f"📈 Success rate: {success_rate:.2f}%")
+            logger.info(f"📈 Success rate: {success_rate:.2f}%")
             
             cases_per_second = self.stats['processed'] / duration if duration > 0 else 0
-            print(f"⚡ Speed: {cases_per_second:.2f} cases/second")
+            logger.info(f"⚡ Speed: {cases_per_second:.2f} cases/second")
         
-        print(f"⏱️  Total time: {hours}h {minutes}m {seconds}s")
-        print(f"⏰ Finished at: {self.stats['end_time'].strftime('%Y-%m-%d %H:%M:%S')}")
-        print("="*70 + "\n")
+        logger.info(f"⏱️  Total time: {hours}h {minutes}m {seconds}s")
+        logger.info(f"⏰ Finished at: {self.stats['end_time'].strftime('%Y-%m-%d %H:%M:%S')}")
+        logger.info("="*70)
     
     def verify_embeddings(self, sample_size=5):
         """
@@ -261,17 +688,79 @@ class CaseEmbeddingGenerator:
         # Check sample embeddings
         print(f"\n🔬 Checking {sample_size} sample embeddings:\n")
         
-        samples = self.cases_collection.find({'embedding': {'$exists': True}}).limit(sample_size)
+        # Random sample; dimensions are computed by the server so no
+        # vectors are transferred. BSON float32 vectors are a 2-byte
+        # header + 4 bytes per dimension; older formats are float16
+        # blobs (2 bytes per dimension) and arrays
+        samples = self.cases_collection.aggregate([
+            {'$match': {'embedding': {'$exists': True}}},
+            {'$sample': {'size': sample_size}},
+            {'$project': {
+                'title': 1,
+                'embedding_generated_at': 1,
+                'embedding_scale': 1,
+                'dimension': {'$switch': {
+                    'branches': [
+                        {
+                            'case': {'$isArray': '$embedding'},
+                            'then': {'$size': '$embedding'}
+                        },
+                        {
+                            'case': {'$eq': [{'$mod': [{'$binarySize': '$embedding'}, 4]}, 2]},
+                            'then': {'$divide': [{'$subtract': [{'$binarySize': '$embedding'}, 2]}, 4]}
+                        }
+                    ],
+                    'default': {'$divide': [{'$binarySize': '$embedding'}, 2]}
+                }},
+                'q8_dimension': {'$binarySize': {'$ifNull': ['$embedding_q8', '']}}
+            }}
+        ])
         
         for i, case in enumerate(samples, 1):
-            embedding = case.get('embedding', [])
             print(f"{i}. Case: {case.get('title', 'Unknown')[:50]}...")
-            print(f"   Embedding dimension: {len(embedding)}")
-            print(f"   Embedding sample: [{embedding[0]:.4f}, {embedding[1]:.4f}, ...]")
+            print(f"   Embedding dimension: {int(case['dimension'])}")
+            if case.get('q8_dimension'):
+                print(f"   int8 copy: {case['q8_dimension']} dims, scale {case['embedding_scale']:.5f}")
             print(f"   Generated: {case.get('embedding_generated_at', 'N/A')}\n")
         
         print("✅ Verification complete!\n")
     
+    def verify_fp16_drift(self, sample_size=100, min_cosine=0.999):
+        """
+        Compare FP16 GPU embeddings against an FP32 copy of the model
+        on a sample of cases; cosine should stay above min_cosine
+        """
+        if self.device != 'cuda':
+            print("⏭️  FP16 drift check skipped (model runs in FP32 on CPU)")
+            return
+        
+        print(f"\n🔬 Checking FP16 drift on {sample_size} cases...")
+        
+        texts = [
+            self._prepare_text_for_embedding(case)
+            for case in self.cases_collection.aggregate([
+                {'$limit': sample_size},
+                self._prepared_fields_stage()
+            ])
+        ]
+        if not texts:
+            print("⚠️ No cases to check")
+            return
+        
+        # Loaded directly: load_sentence_model would have rounded the
+        # weights to FP16 already, hiding exactly the drift measured here
+        fp32_model = SentenceTransformer('all-MiniLM-L6-v2', device='cuda')
+        with torch.inference_mode():
+            fp16 = self.model.encode(texts, batch_size=self.encode_batch_size,
+                                     convert_to_numpy=True, normalize_embeddings=True)
+            fp32 = fp32_model.encode(texts, batch_size=self.encode_batch_size,
+                                     convert_to_numpy=True, normalize_embeddings=True)
+        del fp32_model
+        
+        cosines = np.sum(fp16.astype(np.float32) * fp32, axis=1)
+        status = "✅" if cosines.min() >= min_cosine else "⚠️"
+        print(f"{status} FP16 vs FP32 cosine: min {cosines.min():.5f}, mean {cosines.mean():.5f}")
+    
     def close(self):
         """Close MongoDB connection"""
         self.client.close()
@@ -280,6 +769,8 @@ class CaseEmbeddingGenerator:
 
 # Main execution
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     print("""
     ╔══════════════════════════════════════════════════════════════╗
     ║        LEGAL CASE EMBEDDING GENERATION PIPELINE              ║
@@ -298,7 +789,7 @@ if __name__ == "__main__":
     # For testing: limit=100
     # For production: limit=None
     generator.generate_embeddings_batch(
-        batch_size=32,      # Process 32 cases at a time
+        batch_size=None,    # Default: 1024 cases per encode call
         limit=100,          # Change to None for all cases
         skip_existing=True  # Skip cases that already have embeddings
     )
@@ -0,0 +1,253 @@
+import os
+import numpy as np
+import torch
+from bson.binary import Binary, BinaryVectorDtype
+from sentence_transformers import SentenceTransformer
+
+# BSON binary subtype for packed vectors (indexable by Atlas Vector Search)
+VECTOR_SUBTYPE = 9
+
+# MongoDB "meta" document holding the PCA fitted by reduce_embeddings.py
+PROJECTION_ID = "embedding_pca"
+
+# SBERT on CPU stops scaling at around 8 threads
+MAX_CPU_THREADS = 8
+
+
+def get_device():
+    """Torch device to run models on: GPU when available, else CPU"""
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def cpu_thread_count(processes=1):
+    """Threads per process when `processes` share this machine's cores"""
+    return max(1, min(MAX_CPU_THREADS, (os.cpu_count() or 1) // processes))
+
+
+def set_cpu_threads(processes=1):
+    """
+    Pin torch's intra-op threads to OMP_NUM_THREADS (set per worker by
+    the API launcher) or, when it is unset (e.g. `uvicorn --workers`),
+    cpu_thread_count(processes), instead of defaults that oversubscribe
+    when several workers share the cores
+
+    Args:
+        processes (int): Processes sharing the cores (API workers)
+    """
+    threads = int(os.environ.get("OMP_NUM_THREADS") or cpu_thread_count(processes))
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(2)
+    except RuntimeError:
+        pass  # Only allowed before torch has started parallel work
+    return threads
+
+
+class OnnxSentenceEncoder:
+    """
+    Drop-in for SentenceTransformer.encode backed by an ONNX export of
+    the model on ONNX Runtime: tokenize -> session -> mean pool.
+
+    Export once (O3 runs on CPU or GPU; O4 adds fp16 and is GPU-only):
+        optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 \
+            --optimize O3 models/minilm_onnx/
+    For int8 on CPUs with VNNI, quantize the export as well:
+        optimum-cli onnxruntime quantize --avx512_vnni \
+            --onnx_model models/minilm_onnx/ -o models/minilm_onnx_int8/
+    """
+
+    def __init__(self, model_dir, device=None, max_seq_length=256, normalize=True, threads=None):
+        """
+        Args:
+            model_dir (str): Directory written by optimum-cli
+            device (str): "cuda" for the CUDA provider, else CPU
+            max_seq_length (int): Token limit (MiniLM truncates at 256)
+            normalize (bool): Always L2-normalize, like the Normalize
+                module that ends the all-MiniLM-L6-v2 pipeline
+            threads (int): CPU threads for the session (None = default)
+        """
+        # Optional dependency, only needed for nlp.runtime: "onnx"
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        provider = "CUDAExecutionProvider" if device == "cuda" else "CPUExecutionProvider"
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            session_options.intra_op_num_threads = threads
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ORTModelForFeatureExtraction.from_pretrained(
+            model_dir, provider=provider, session_options=session_options
+        )
+        self.max_seq_length = max_seq_length
+        self.normalize = normalize
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False,
+               convert_to_numpy=True, normalize_embeddings=False):
+        """Same contract as SentenceTransformer.encode (numpy output only)"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        # Longest first, like SentenceTransformer, so mini-batches pad less
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        embeddings = [None] * len(sentences)
+
+        for start in range(0, len(sentences), batch_size):
+            rows = order[start:start + batch_size]
+            features = self.tokenizer(
+                [sentences[row] for row in rows],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            hidden = self.session(**features).last_hidden_state
+
+            # Mean pooling over real (non-padding) tokens
+            mask = features["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            for row, embedding in zip(rows, pooled):
+                embeddings[row] = embedding
+
+        embeddings = np.vstack(embeddings).astype(np.float32)
+        if self.normalize or normalize_embeddings:
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings[0] if single else embeddings
+
+
+def load_sentence_model(model_name, device=None, onnx_dir=None, processes=1):
+    """
+    Load a SentenceTransformer on the GPU when available, in FP16
+    there (MiniLM embeddings stay within ~0.999 cosine of FP32).
+    With onnx_dir, load that ONNX export on ONNX Runtime instead.
+    On CPU, `processes` (e.g. API workers) share the cores.
+    """
+    device = device or get_device()
+    threads = set_cpu_threads(processes) if device == "cpu" else None
+    if onnx_dir:
+        return OnnxSentenceEncoder(onnx_dir, device, threads=threads)
+    model = SentenceTransformer(model_name, device=device)
+    if device == "cuda":
+        model.half()
+    return model
+
+
+def encode_embedding(embedding):
+    """
+    Pack an embedding for MongoDB as a BSON float32 vector (subtype 9):
+    1536 bytes for 384 dimensions instead of a ~3.4 KB array of doubles
+    """
+    return Binary.from_vector(
+        np.asarray(embedding, dtype=np.float32).tolist(),
+        BinaryVectorDtype.FLOAT32
+    )
+
+
+def decode_embedding(value):
+    """
+    Unpack a stored embedding into a float32 vector.
+    Accepts BSON float32 vectors, older float16 byte blobs and legacy
+    list embeddings.
+    """
+    if isinstance(value, Binary) and value.subtype == VECTOR_SUBTYPE:
+        # 2-byte header (dtype, padding) then packed little-endian float32
+        return np.frombuffer(value, dtype="<f4", offset=2)
+    if isinstance(value, bytes):  # bson Binary is a bytes subclass
+        return np.frombuffer(value, dtype=np.float16).astype(np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def quantize_embedding(embedding):
+    """
+    Symmetric int8 quantization with a per-vector scale.
+
+    Returns:
+        tuple: (Binary of 384 int8 bytes, float scale) -- 4x smaller than
+        float32; cosine similarity moves by ~0.005 at most for MiniLM
+    """
+    embedding = np.asarray(embedding, dtype=np.float32)
+    scale = float(np.abs(embedding).max()) / 127 or 1.0
+    quantized = np.round(embedding / scale).astype(np.int8)
+    return Binary(quantized.tobytes()), scale
+
+
+def dequantize_embedding(value, scale):
+    """Inverse of quantize_embedding, as a float32 vector"""
+    return np.frombuffer(value, dtype=np.int8).astype(np.float32) * scale
+
+
+class EmbeddingProjection:
+    """
+    PCA (whitened by default) from the model's 384 dimensions to a
+    narrower space. Applied to the int8 copies the search index is
+    built from and to queries before searching; the float32 vectors
+    stay in model space.
+    """
+
+    def __init__(self, components, mean, scale):
+        """
+        Args:
+            components (np.ndarray): (dim, input_dim) principal axes
+            mean (np.ndarray): (input_dim,) mean removed before projecting
+            scale (np.ndarray): (dim,) per-component scale (whitening)
+        """
+        self.components = components
+        self.mean = mean
+        self.scale = scale
+
+    @property
+    def dim(self):
+        return self.components.shape[0]
+
+    @property
+    def input_dim(self):
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(cls, matrix, dim, whiten=True):
+        """Fit on an (N, input_dim) sample of embeddings"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        mean = matrix.mean(axis=0)
+        _, singular_values, axes = np.linalg.svd(matrix - mean, full_matrices=False)
+
+        if whiten:
+            std = singular_values[:dim] / np.sqrt(max(len(matrix) - 1, 1))
+            scale = 1 / np.maximum(std, 1e-12)
+        else:
+            scale = np.ones(dim)
+
+        return cls(
+            axes[:dim].astype(np.float32),
+            mean.astype(np.float32),
+            scale.astype(np.float32)
+        )
+
+    def project(self, vectors):
+        """Project one vector or an (N, input_dim) matrix"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return ((vectors - self.mean) @ self.components.T) * self.scale
+
+    def to_document(self):
+        """MongoDB document for the meta collection"""
+        return {
+            "_id": PROJECTION_ID,
+            "dim": self.dim,
+            "input_dim": self.input_dim,
+            "components": Binary(self.components.astype("<f4").tobytes()),
+            "mean": Binary(self.mean.astype("<f4").tobytes()),
+            "scale": Binary(self.scale.astype("<f4").tobytes()),
+        }
+
+    @classmethod
+    def from_document(cls, document):
+        """Inverse of to_document (None when no projection is stored)"""
+        if not document:
+            return None
+        components = np.frombuffer(document["components"], dtype="<f4")
+        return cls(
+            components.reshape(document["dim"], document["input_dim"]),
+            np.frombuffer(document["mean"], dtype="<f4"),
+            np.frombuffer(document["scale"], dtype="<f4")
+        )
@@ -1,16 +1,93 @@
+import asyncio
+import inspect
 import numpy as np
-from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import faiss
+import torch
+from cachetools import LRUCache, TTLCache
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import threading
+import time
+from datetime import datetime
 from dotenv import load_dotenv
 from config_loader import load_config
+from src.models.embeddings import (
+    decode_embedding, dequantize_embedding, load_sentence_model,
+    EmbeddingProjection, PROJECTION_ID
+)
 load_dotenv()
 
 
+# Fields needed to build a search result (never the embedding or raw text)
+RESULT_PROJECTION = {
+    "case_id": 1,
+    "title": 1,
+    "court": 1,
+    "date": 1,
+    "citations": 1,
+    "petitioner": 1,
+    "respondent": 1,
+    "cleaned_text": 1,
+    "judgment_text": 1,
+}
+
+# Documents per cursor batch when streaming embeddings or ids
+EMBEDDING_BATCH_SIZE = 1000
+
+
+# HNSW graph parameters for the in-process index
+HNSW_NEIGHBORS = 32
+HNSW_EF_SEARCH = 128
+
+# Wait this long before retrying a failed background index rebuild
+INDEX_RETRY_SECONDS = 60
+
+
+# One embedding model per process, shared by every LegalCaseSearch instance
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_embedding_model(model_name, onnx_dir=None):
+    """
+    Load a SentenceTransformer once per process (thread-safe, lazy),
+    on the GPU in FP16 when one is available, or its ONNX export on
+    ONNX Runtime when onnx_dir is given.
+    """
+    key = (model_name, onnx_dir)
+    model = _models.get(key)
+    if model is None:
+        with _models_lock:
+            model = _models.get(key)
+            if model is None:
+                print(f"📥 Loading search model: {onnx_dir or model_name}...")
+                # Every API worker loads its own copy: split the cores
+                workers = load_config()["api"]["workers"]
+                model = load_sentence_model(model_name, onnx_dir=onnx_dir, processes=workers)
+                _models[key] = model
+                print("✅ Model loaded!")
+    return model
+
+
+# Recent query embeddings per process, keyed by (model, normalized query);
+# repeated queries (e.g. the frontend's example buttons) skip the model
+QUERY_CACHE_SIZE = 4096
+_query_cache = LRUCache(maxsize=QUERY_CACHE_SIZE)
+_query_cache_lock = threading.Lock()
+
+
 class LegalCaseSearch:
     """
     Semantic search for legal cases using embeddings
+
+    MongoDB access goes through motor, so every query method is a
+    coroutine. Call `await build_index()` once before searching.
+
+    Nearest-neighbour search uses either MongoDB Atlas $vectorSearch
+    (search.vector_backend: "atlas") or an in-process FAISS HNSW index
+    rebuilt every search.index_ttl_seconds ("faiss"). Filtered FAISS
+    searches score every matching case against the index's 8-bit codes
+    instead of walking the graph.
     """
 
     def __init__(self):
@@ -25,49 +102,335 @@ class LegalCaseSearch:
             "MONGODB_DB",
             config["mongodb"]["database"]
         )
-        self.client = MongoClient(mongo_uri)
+        self.client = AsyncIOMotorClient(mongo_uri)
         self.db = self.client[db_name]
         self.cases_collection = self.db["cases"]
+        self.meta_collection = self.db["meta"]
 
         print(f"✅ Connected to MongoDB: {db_name}")
 
-        print("📥 Loading search model...")
-        self.model = SentenceTransformer(
-            config["nlp"]["embedding_model"]
+        self.model_name = config["nlp"]["embedding_model"]
+        self.onnx_dir = (
+            config["nlp"]["onnx_model_dir"] if config["nlp"]["runtime"] == "onnx" else None
         )
-        print("✅ Model loaded!")
+
+        search_config = config["search"]
+        self.backend = search_config["vector_backend"]
+        self.atlas_index = search_config["atlas_index_name"]
+        self.index_ttl = search_config["index_ttl_seconds"]
+
+        self.index = None
+        self.projection = None
+        self.case_ids = []
+        self.id_to_row = {}
+        self.index_built_at = 0.0
+        self._rebuild_task = None
+
+        # The frontend sidebar asks for statistics on every render
+        self._stats_cache = TTLCache(maxsize=1, ttl=30)
+
+    @property
+    def model(self):
+        return get_embedding_model(self.model_name, self.onnx_dir)
 
     # --------------------------------------------------
-    # MAIN SEARCH
+    # QUERY ENCODING
     # --------------------------------------------------
-    def search_similar_cases(self, query, top_k=10, filters=None):
-        print(f"\n🔍 Searching for: '{query}'")
-        print(f"📊 Returning top {top_k} results\n")
+    def encode_queries(self, queries):
+        """
+        Embed several queries, serving repeats from the LRU cache and
+        encoding the rest in a single forward pass
+        """
+        keys = [(self.model_name, query.strip().lower()) for query in queries]
+
+        with _query_cache_lock:
+            cached = {key: _query_cache[key] for key in keys if key in _query_cache}
+
+        # Only the cache key is normalized: the model sees the first raw
+        # query for each key (cased models would embed the lowered text
+        # differently from the documents)
+        missing = {}
+        for key, query in zip(keys, queries):
+            if key not in cached:
+                missing.setdefault(key, query)
+
+        if missing:
+            with torch.inference_mode():
+                embeddings = self.model.encode(
+                    list(missing.values()),
+                    batch_size=len(missing),
+                    show_progress_bar=False,
+                    convert_to_numpy=True
+                )
+            with _query_cache_lock:
+                for key, embedding in zip(missing, embeddings):
+                    _query_cache[key] = embedding
+                    cached[key] = embedding
+
+        return np.stack([cached[key] for key in keys])
+
+    # --------------------------------------------------
+    # VECTOR INDEX
+    # --------------------------------------------------
+    async def build_index(self):
+        """
+        Load every stored embedding into an in-memory FAISS HNSW index
+        (inner product on normalized vectors = cosine similarity).
+        Row i of the index is the case with _id self.case_ids[i].
+
+        The int8 copies (embedding_q8) are read when present, a quarter
+        of the bytes of the float32 vectors, and the index keeps vectors
+        as 8-bit codes too.
+
+        The new index replaces the old one only once it is complete, so
+        searches keep running during a rebuild. Not used with Atlas.
+
+        When reduce_embeddings.py has stored a PCA, the index lives in
+        its reduced space; queries are projected the same way.
+        """
+        if self.backend == "atlas":
+            return
+
+        print("📥 Building vector index...")
+
+        ids = []
+        vectors = []
+        cursor = self.cases_collection.find(
+            {"embedding_q8": {"$exists": True}},
+            {"embedding_q8": 1, "embedding_scale": 1},
+            batch_size=EMBEDDING_BATCH_SIZE
+        )
+        async for case in cursor:
+            ids.append(case["_id"])
+            vectors.append(dequantize_embedding(case["embedding_q8"], case["embedding_scale"]))
+
+        # Cases embedded before int8 copies existed
+        cursor = self.cases_collection.find(
+            {"embedding": {"$exists": True}, "embedding_q8": {"$exists": False}},
+            {"embedding": 1},
+            batch_size=EMBEDDING_BATCH_SIZE
+        )
+        async for case in cursor:
+            ids.append(case["_id"])
+            vectors.append(decode_embedding(case["embedding"]))
+
+        projection = EmbeddingProjection.from_document(
+            await self.meta_collection.find_one({"_id": PROJECTION_ID})
+        )
 
-        query_embedding = self.model.encode(query, convert_to_numpy=True)
+        # Graph construction is CPU-heavy, keep it off the event loop
+        if vectors:
+            index = await asyncio.to_thread(self._make_index, vectors, projection)
+        else:
+            index = None
+
+        self.index = index
+        self.projection = projection
+        self.case_ids = ids
+        self.id_to_row = {case_id: row for row, case_id in enumerate(ids)}
+        self.index_built_at = time.monotonic()
+
+        if index is None:
+            print("⚠️ No embeddings found, index is empty")
+        else:
+            print(f"✅ Indexed {index.ntotal:,} cases")
+
+    @staticmethod
+    def _make_index(vectors, projection=None):
+        """HNSW index over the normalized vectors"""
+        if projection is not None:
+            # Vectors not yet rewritten by reduce_embeddings.py are still
+            # in model space
+            vectors = [
+                projection.project(vector) if vector.size == projection.input_dim else vector
+                for vector in vectors
+            ]
+
+        matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        faiss.normalize_L2(matrix)
+
+        # 8-bit scalar-quantized storage: 1 byte per dimension in RAM
+        index = faiss.IndexHNSWSQ(
+            matrix.shape[1],
+            faiss.ScalarQuantizer.QT_8bit,
+            HNSW_NEIGHBORS,
+            faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        index.train(matrix)
+        index.add(matrix)
+        return index
+
+    def _refresh_index_if_stale(self):
+        """Rebuild the index in the background once it is older than the TTL"""
+        if self._rebuild_task and not self._rebuild_task.done():
+            return
+        if time.monotonic() - self.index_built_at >= self.index_ttl:
+            self._rebuild_task = asyncio.create_task(self.build_index())
+            self._rebuild_task.add_done_callback(self._on_rebuild_done)
+
+    def _on_rebuild_done(self, task):
+        """Report a failed rebuild and back off instead of retrying per search"""
+        if task.cancelled() or task.exception() is None:
+            return
+        print(f"❌ Index rebuild failed: {task.exception()}")
+        # The current index keeps serving; look again in INDEX_RETRY_SECONDS
+        self.index_built_at = time.monotonic() - self.index_ttl + INDEX_RETRY_SECONDS
+
+    async def _source_embedding(self, source_id):
+        """
+        Embedding of an indexed case (None if it has none), in the
+        index's space (already PCA-reduced with the FAISS backend)
+        """
+        if self.backend == "atlas":
+            case = await self.cases_collection.find_one({"_id": source_id}, {"embedding": 1})
+            return decode_embedding(case["embedding"]) if case and "embedding" in case else None
+
+        # The source vector is already in the index, no need to refetch it
+        row = self.id_to_row.get(source_id)
+        return self.index.reconstruct(row) if row is not None else None
+
+    async def _encode_query(self, query):
+        """Embed one query in a thread so the event loop keeps serving"""
+        return (await asyncio.to_thread(self.encode_queries, [query]))[0]
+
+    async def _matching_ids(self, filters, exclude_id=None):
+        """_ids of the cases matching MongoDB filters"""
+        return [
+            case["_id"]
+            async for case in self.cases_collection.find(
+                filters, {"_id": 1}, batch_size=EMBEDDING_BATCH_SIZE
+            )
+            if case["_id"] != exclude_id
+        ]
+
+    async def _ranked_cases(self, query_embedding, top_k, filters=None, exclude_id=None,
+                            in_index_space=False):
+        """
+        Return [(case, score), ...] for the top_k nearest cases,
+        best first, applying optional MongoDB filters.
+        Model-space queries are projected to the index's space unless
+        in_index_space (e.g. vectors from _source_embedding).
+
+        query_embedding may also be an awaitable (a query still being
+        encoded); the filter's MongoDB query then runs concurrently.
+        """
+        matching_ids = None
+        if filters and self.backend != "atlas":
+            if inspect.isawaitable(query_embedding):
+                query_embedding, matching_ids = await asyncio.gather(
+                    query_embedding, self._matching_ids(filters, exclude_id)
+                )
+            else:
+                matching_ids = await self._matching_ids(filters, exclude_id)
+        elif inspect.isawaitable(query_embedding):
+            query_embedding = await query_embedding
+
+        query = np.array(query_embedding, dtype=np.float32).reshape(1, -1)
+
+        if self.backend == "atlas":
+            faiss.normalize_L2(query)
+            return await self._ranked_cases_atlas(query[0], top_k, filters, exclude_id)
+
+        self._refresh_index_if_stale()
+
+        # Snapshot, a background rebuild may swap these out
+        index = self.index
+        projection = self.projection
+        case_ids = self.case_ids
+        id_to_row = self.id_to_row
+        if index is None:
+            return []
 
-        mongo_query = {"embedding": {"$exists": True}}
+        if projection is not None and not in_index_space:
+            query = projection.project(query)
+        faiss.normalize_L2(query)
+
+        if filters:
+            # Exhaustive scan of the 8-bit codes (the HNSW's flat storage)
+            # restricted to the cases matching the filter: exact top-k
+            # among them, no float32 copy of the vectors kept in RAM
+            rows = np.array(
+                [id_to_row[case_id] for case_id in matching_ids if case_id in id_to_row],
+                dtype=np.int64
+            )
+            if not len(rows):
+                return []
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(rows))
+            scores, found = index.storage.search(query, min(top_k, len(rows)), params=params)
+            hits = [
+                (case_ids[row], float(score))
+                for score, row in zip(scores[0], found[0])
+                if row != -1
+            ]
+        else:
+            scores, rows = index.search(query, min(top_k + (exclude_id is not None), index.ntotal))
+            hits = [
+                (case_ids[row], float(score))
+                for score, row in zip(scores[0], rows[0])
+                if row != -1 and case_ids[row] != exclude_id
+            ]
+
+        cases = {
+            case["_id"]: case
+            async for case in self.cases_collection.find(
+                {"_id": {"$in": [case_id for case_id, _ in hits]}}, RESULT_PROJECTION
+            )
+        }
+        return [(cases[case_id], score) for case_id, score in hits if case_id in cases][:top_k]
+
+    async def _ranked_cases_atlas(self, query, top_k, filters=None, exclude_id=None):
+        """
+        Nearest neighbours via MongoDB Atlas $vectorSearch (HNSW on the
+        server). Court regex filters are not supported inside
+        $vectorSearch, so they run as a $match on oversampled results.
+        """
+        limit = top_k * 10 if filters else top_k + (exclude_id is not None)
+
+        pipeline = [
+            {
+                "$vectorSearch": {
+                    "index": self.atlas_index,
+                    "path": "embedding",
+                    "queryVector": query.tolist(),
+                    "numCandidates": min(10000, max(200, limit * 20)),  # Atlas max
+                    "limit": limit,
+                }
+            },
+            {"$project": {**RESULT_PROJECTION, "score": {"$meta": "vectorSearchScore"}}},
+        ]
+        if exclude_id is not None:
+            pipeline.append({"$match": {"_id": {"$ne": exclude_id}}})
         if filters:
-            mongo_query.update(filters)
+            pipeline.append({"$match": filters})
+        pipeline.append({"$limit": top_k})
 
-        cases = list(self.cases_collection.find(mongo_query))
+        # Atlas reports cosine scores rescaled to [0, 1]; undo that
+        return [
+            (case, 2 * case.pop("score") - 1)
+            async for case in self.cases_collection.aggregate(pipeline)
+        ]
 
-        if not cases:
-            print("❌ No cases found with embeddings!")
-            return []
+    # --------------------------------------------------
+    # MAIN SEARCH
+    # --------------------------------------------------
+    async def search_similar_cases(self, query, top_k=10, filters=None, query_embedding=None):
+        print(f"\n🔍 Searching for: '{query}'")
+        print(f"📊 Returning top {top_k} results\n")
 
-        print(f"📚 Searching through {len(cases):,} cases...")
+        # Callers that batch queries (the API) pass the embedding in, or
+        # an awaitable for it; either way encoding overlaps the filter query
+        if query_embedding is None:
+            query_embedding = self._encode_query(query)
 
-        case_embeddings = np.array([case["embedding"] for case in cases])
-        similarities = cosine_similarity([query_embedding], case_embeddings)[0]
+        ranked = await self._ranked_cases(query_embedding, top_k, filters)
 
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        if not ranked:
+            print("❌ No cases found with embeddings!")
+            return []
 
         results = []
-        for idx in top_indices:
-            case = cases[idx]
-            score = float(similarities[idx])
-
+        for case, score in ranked:
             result = {
                 "case_id": case.get("case_id"),
                 "title": case.get("title", "Unknown"),
@@ -105,33 +468,20 @@ class LegalCaseSearch:
     # --------------------------------------------------
     # SEARCH BY CASE ID
     # --------------------------------------------------
-    def search_by_case_id(self, case_id, top_k=10):
-        source_case = self.cases_collection.find_one({"case_id": case_id})
+    async def search_by_case_id(self, case_id, top_k=10):
+        source_case = await self.cases_collection.find_one({"case_id": case_id}, {"_id": 1})
 
-        if not source_case or "embedding" not in source_case:
+        if not source_case:
             return []
 
-        query_embedding = np.array(source_case["embedding"])
-
-        cases = list(
-            self.cases_collection.find(
-                {"embedding": {"$exists": True}, "case_id": {"$ne": case_id}}
-            )
-        )
-
-        if not cases:
+        query_embedding = await self._source_embedding(source_case["_id"])
+        if query_embedding is None:
             return []
 
-        case_embeddings = np.array([case["embedding"] for case in cases])
-        similarities = cosine_similarity([query_embedding], case_embeddings)[0]
-
-        top_indices = np.argsort(similarities)[::-1][:top_k]
-
         results = []
-        for idx in top_indices:
-            case = cases[idx]
-            score = float(similarities[idx])
-
+        for case, score in await self._ranked_cases(
+            query_embedding, top_k, exclude_id=source_case["_id"], in_index_space=True
+        ):
             result = {
                 "case_id": case.get("case_id"),
                 "title": case.get("title", "Unknown"),
@@ -150,21 +500,24 @@ class LegalCaseSearch:
     # --------------------------------------------------
     # ADVANCED SEARCH
     # --------------------------------------------------
-    def advanced_search(self, query, court=None, year_from=None, year_to=None, top_k=10):
+    async def advanced_search(self, query, court=None, year_from=None, year_to=None, top_k=10):
         filters = {}
         if court:
             filters["court"] = {"$regex": court, "$options": "i"}
-        return self.search_similar_cases(query, top_k, filters)
+        return await self.search_similar_cases(query, top_k, filters)
 
     # --------------------------------------------------
     # CASE DETAILS
     # --------------------------------------------------
-    def get_case_details(self, case_id):
-        case = self.cases_collection.find_one({"case_id": case_id})
+    async def get_case_details(self, case_id):
+        # Vectors are binary and large, never send them to clients
+        case = await self.cases_collection.find_one(
+            {"case_id": case_id},
+            {"embedding": 0, "embedding_q8": 0, "embedding_scale": 0}
+        )
         if not case:
             return None
 
-        case.pop("embedding", None)
         if "_id" in case:
             case["_id"] = str(case["_id"])
 
@@ -173,19 +526,30 @@ class LegalCaseSearch:
     # --------------------------------------------------
     # STATISTICS
     # --------------------------------------------------
-    def get_statistics(self):
-        total_cases = self.cases_collection.count_documents({})
-        cases_with_embeddings = self.cases_collection.count_documents(
-            {"embedding": {"$exists": True}}
+    async def get_statistics(self):
+        stats = self._stats_cache.get("stats")
+        if stats is not None:
+            return stats
+
+        # Collection metadata instead of counting documents
+        total_cases = await self.cases_collection.estimated_document_count()
+
+        # Range on the embedding_generated_at index (set with every
+        # embedding): a count of index keys, no document fetches
+        cases_with_embeddings = await self.cases_collection.count_documents(
+            {"embedding_generated_at": {"$gte": datetime.min}}
         )
 
-        return {
+        stats = {
             "total_cases": total_cases,
             "searchable_cases": cases_with_embeddings,
             "coverage_percentage": f"{(cases_with_embeddings / total_cases * 100):.2f}%",
             "embedding_model": "all-MiniLM-L6-v2",
-            "embedding_dimension": 384,
+            # The FAISS index is in the PCA space once one is stored
+            "embedding_dimension": self.projection.dim if self.projection else 384,
         }
+        self._stats_cache["stats"] = stats
+        return stats
 
     def close(self):
         self.client.close()
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.api.batching import QueryEmbeddingBatcher
+
+
+def fake_encode(calls):
+    """encode_fn recording each batch and embedding a query as [len(query)]"""
+    def encode(queries):
+        calls.append(list(queries))
+        return [[float(len(query))] for query in queries]
+    return encode
+
+
+def run_batcher(batcher, scenario):
+    """Run the async scenario() in a fresh event loop with the batcher started"""
+    async def main():
+        batcher.start()
+        try:
+            return await scenario()
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+
+async def embed_all(batcher, queries, **gather_options):
+    return await asyncio.gather(*(batcher.embed(query) for query in queries), **gather_options)
+
+
+def test_concurrent_queries_are_coalesced_up_to_max_batch_size():
+    calls = []
+    batcher = QueryEmbeddingBatcher(fake_encode(calls), max_batch_size=4, max_wait_ms=50)
+    queries = [f"query {'x' * i}" for i in range(10)]
+
+    run_batcher(batcher, lambda: embed_all(batcher, queries))
+
+    assert [len(batch) for batch in calls] == [4, 4, 2]
+    assert [query for batch in calls for query in batch] == queries
+
+
+def test_each_request_gets_its_own_vector_in_order():
+    batcher = QueryEmbeddingBatcher(fake_encode([]), max_batch_size=8, max_wait_ms=50)
+    queries = ["a", "bbb", "cc", "dddd", "eeeee"]
+
+    results = run_batcher(batcher, lambda: embed_all(batcher, queries))
+
+    assert results == [[float(len(query))] for query in queries]
+
+
+def test_encode_error_reaches_every_waiter():
+    def encode(queries):
+        raise RuntimeError("model failed")
+
+    batcher = QueryEmbeddingBatcher(encode, max_batch_size=8, max_wait_ms=50)
+
+    results = run_batcher(batcher, lambda: embed_all(batcher, "abc", return_exceptions=True))
+
+    assert len(results) == 3
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_batcher_keeps_serving_after_an_encode_error():
+    failures = [RuntimeError("model failed")]
+
+    def encode(queries):
+        if failures:
+            raise failures.pop()
+        return [[1.0] for _ in queries]
+
+    batcher = QueryEmbeddingBatcher(encode, max_batch_size=8, max_wait_ms=10)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await batcher.embed("first")
+        return await batcher.embed("second")
+
+    assert run_batcher(batcher, scenario) == [1.0]
+
+
+def test_cancelled_request_does_not_break_the_batch():
+    started = threading.Event()
+    release = threading.Event()
+
+    def encode(queries):
+        started.set()
+        release.wait(5)
+        return [[float(len(query))] for query in queries]
+
+    batcher = QueryEmbeddingBatcher(encode, max_batch_size=8, max_wait_ms=10)
+
+    async def scenario():
+        tasks = [asyncio.create_task(batcher.embed(query)) for query in ["a", "bb", "ccc"]]
+        # Cancel one request while its batch is being encoded
+        await asyncio.to_thread(started.wait, 5)
+        tasks[1].cancel()
+        release.set()
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # The batcher still serves later requests
+        results.append(await batcher.embed("dddd"))
+        return results
+
+    first, cancelled, third, later = run_batcher(batcher, scenario)
+
+    assert first == [1.0]
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert third == [3.0]
+    assert later == [4.0]
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from bson.binary import Binary
+
+from src.models.embeddings import (
+    encode_embedding, decode_embedding, quantize_embedding, dequantize_embedding,
+    EmbeddingProjection, PROJECTION_ID
+)
+
+
+def random_vector(seed=0, dim=384):
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_decode_bson_float32_vector():
+    vector = random_vector()
+    np.testing.assert_array_equal(decode_embedding(encode_embedding(vector)), vector)
+
+
+def test_decode_float16_blob():
+    vector = random_vector()
+    blob = Binary(vector.astype(np.float16).tobytes())
+    decoded = decode_embedding(blob)
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, vector, atol=1e-3)
+
+
+def test_decode_legacy_list():
+    vector = random_vector()
+    decoded = decode_embedding(vector.astype(np.float64).tolist())
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, vector, rtol=1e-6)
+
+
+def test_quantize_round_trip_keeps_cosine():
+    vector = random_vector()
+    quantized, scale = quantize_embedding(vector)
+    assert len(quantized) == vector.size
+    restored = dequantize_embedding(quantized, scale)
+    cosine = restored @ vector / np.linalg.norm(restored)
+    assert cosine > 0.999
+    np.testing.assert_allclose(restored, vector, atol=scale / 2 + 1e-7)
+
+
+def test_quantize_zero_vector():
+    quantized, scale = quantize_embedding(np.zeros(8, dtype=np.float32))
+    assert scale == 1.0
+    np.testing.assert_array_equal(dequantize_embedding(quantized, scale), np.zeros(8))
+
+
+@pytest.mark.parametrize("whiten", [True, False])
+def test_projection_document_round_trip(whiten):
+    sample = np.vstack([random_vector(seed) for seed in range(200)])
+    projection = EmbeddingProjection.fit(sample, 32, whiten=whiten)
+
+    document = projection.to_document()
+    assert document["_id"] == PROJECTION_ID
+    restored = EmbeddingProjection.from_document(document)
+
+    assert (restored.dim, restored.input_dim) == (32, 384)
+    np.testing.assert_array_equal(restored.project(sample), projection.project(sample))
+
+
+def test_projection_from_missing_document():
+    assert EmbeddingProjection.from_document(None) is None
@@ -0,0 +1,71 @@
+import random
+import re
+
+import pytest
+
+from src.etl.pdf_extractor import PDFExtractor
+
+
+def baseline_metadata(text):
+    """The per-field _extract_metadata the single-pass version replaced"""
+    metadata = {"title": "Unknown", "date": None, "bench": None,
+                "petitioner": None, "respondent": None}
+
+    title_match = re.search(
+        r"([A-Z][A-Za-z\s]+)\s+(?:vs?\.?|versus)\s+([A-Z][A-Za-z\s]+)",
+        text[:1000]
+    )
+    if title_match:
+        metadata["title"] = f"{title_match.group(1)} vs {title_match.group(2)}"
+        metadata["petitioner"] = title_match.group(1).strip()
+        metadata["respondent"] = title_match.group(2).strip()
+
+    date_patterns = [
+        r"(?:Decided on|Judgment dated)[\s:]+(\d{1,2}[-/]\d{1,2}[-/]\d{4})",
+        r"(\d{1,2}\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{4})"
+    ]
+    for pattern in date_patterns:
+        match = re.search(pattern, text[:2000], re.IGNORECASE)
+        if match:
+            metadata["date"] = match.group(1)
+            break
+
+    bench_match = re.search(r"(?:BENCH|CORAM)[\s:]+(.+?)(?:\n|JUDGMENT)", text[:2000], re.IGNORECASE)
+    if bench_match:
+        metadata["bench"] = bench_match.group(1).strip()
+
+    return metadata
+
+
+def extract(text):
+    metadata = PDFExtractor._extract_metadata(object.__new__(PDFExtractor), text)
+    return {field: metadata[field] for field in ("title", "date", "bench", "petitioner", "respondent")}
+
+
+HEADERS = [
+    "Supreme Court\nBENCH Justice Ram\nJUDGMENT\nRam Kumar vs State of Punjab\n",
+    "CORAM: Justice Das on 5 March 2002\nRam vs State\n",
+    "Ram Kumar vs State of Punjab\nCORAM: Justice A. Sen\nDecided on 12/03/1999\n",
+    "Judgment dated 01-02-2003 and delivered on 4 April 2003\nBENCH: X, Y JUDGMENT text",
+    "coram: justice lower case\n7 july 1990\nAmit versus Union of India\n",
+    "x" * 990 + " Alpha Beta vs Gamma Delta Epsilon\n",
+    "No metadata here at all.",
+]
+
+FRAGMENTS = [
+    "Ram Kumar vs State of Punjab", "A v. B", "Mohan versus Union", "BENCH ", "CORAM: ",
+    "Justice Ram", "JUDGMENT", "Decided on 5/3/2002", "Judgment dated 12-11-1999",
+    "5 March 2002", "21 december 1999", "on ", "\n", " ", "x" * 300,
+]
+
+
+@pytest.mark.parametrize("header", HEADERS)
+def test_metadata_matches_baseline_on_fixtures(header):
+    assert extract(header) == baseline_metadata(header)
+
+
+def test_metadata_matches_baseline_on_random_headers():
+    rng = random.Random(0)
+    for _ in range(2000):
+        header = "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 20)))
+        assert extract(header) == baseline_metadata(header), header